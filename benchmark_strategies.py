@@ -0,0 +1,134 @@
+"""
+Mappings of the mapping_benchmark strategies, one `configure_*` function each
+
+Each function imports what its strategy needs itself, so the benchmark can
+time the imports and the configuration of a single strategy in a bare
+interpreter. `configure_twin` is also the setup of tests/test_twin_mapping.py.
+"""
+
+
+def configure_imperative():
+    from typing import List
+
+    import dataclasses as _dc
+
+    import sqlalchemy as _sa
+    import sqlalchemy.orm as _orm
+
+    @_dc.dataclass
+    class DomainDog:
+        id: int = None
+        nom: str = None
+        owner: "DomainUser" = None
+
+    @_dc.dataclass
+    class DomainUser:
+        id: int = None
+        name: str = None
+        dogs: List[DomainDog] = _dc.field(default_factory=list)
+
+    mapper_registry = _orm.registry()
+    user_table, dog_table = _tables(_sa, mapper_registry.metadata)
+    mapper_registry.map_imperatively(DomainUser, user_table)
+    mapper_registry.map_imperatively(
+        DomainDog,
+        dog_table,
+        properties={
+            "owner": _orm.relationship(DomainUser, backref="dogs"),
+            "nom": dog_table.c.name,
+        },
+    )
+    return DomainUser, DomainDog, mapper_registry.metadata
+
+
+def configure_twin():
+    from typing import List
+
+    import sqlalchemy as _sa
+    import sqlalchemy.orm as _orm
+
+    from twin_mapping import TwinMapper
+
+    class DomainDog:
+        id: int
+        name: str
+        owner: "DomainUser"
+
+        def __init__(self, id=None, name=None, owner=None):
+            self.id = id
+            self.name = name
+            self.owner = owner
+
+    class DomainUser:
+        id: int
+        name: str
+        dogs: List[DomainDog]
+
+        def __init__(self, id=None, name=None, dogs=None):
+            self.id = id
+            self.name = name
+            self.dogs = dogs or []
+
+    class OrmDog:
+        pass
+
+    class OrmUser:
+        pass
+
+    mapper_registry = _orm.registry()
+    user_table, dog_table = _tables(_sa, mapper_registry.metadata)
+    mapper_registry.map_imperatively(OrmUser, user_table)
+    mapper_registry.map_imperatively(
+        OrmDog,
+        dog_table,
+        properties={"owner": _orm.relationship(OrmUser, backref="dogs")},
+    )
+
+    class ConcreteTwinMapper(TwinMapper):
+        mapping = [
+            (DomainUser, OrmUser),
+            (DomainDog, OrmDog),
+        ]
+        fields = {
+            DomainUser: {"id": "id", "name": "name", "dogs": "dogs"},
+            DomainDog: {"id": "id", "name": "name", "owner": "owner"},
+        }
+
+    return DomainUser, DomainDog, ConcreteTwinMapper, mapper_registry.metadata
+
+
+def configure_pydantic():
+    from typing import List, Optional
+
+    import pydantic as _pydantic
+    import sqlalchemy as _sa
+
+    class PydanticDog(_pydantic.BaseModel):
+        id: Optional[int]
+        name: str
+
+    class PydanticUser(_pydantic.BaseModel):
+        id: Optional[int]
+        name: str
+        dogs: List[PydanticDog] = []
+
+    metadata = _sa.MetaData()
+    user_table, dog_table = _tables(_sa, metadata)
+    return PydanticUser, PydanticDog, user_table, dog_table, metadata
+
+
+def _tables(_sa, metadata):
+    user_table = _sa.Table(
+        "user",
+        metadata,
+        _sa.Column("id", _sa.Integer, primary_key=True),
+        _sa.Column("name", _sa.String(50)),
+    )
+    dog_table = _sa.Table(
+        "dog",
+        metadata,
+        _sa.Column("id", _sa.Integer, primary_key=True),
+        _sa.Column("name", _sa.String(50)),
+        _sa.Column("owner_id", _sa.Integer, _sa.ForeignKey(user_table.c.id)),
+    )
+    return user_table, dog_table
@@ -0,0 +1,351 @@
+"""
+Benchmark of the persistence designs explored in the tests
+
+Strategies:
+
+imperative
+Dataclasses mapped imperatively (tests/test_with_dataclass.py, tests/test_domain.py)
+
+twin / twin_bulk
+Plain domain classes with separate ORM twins (twin_mapping.py),
+persisted with `TwinMapper.add` / `TwinMapper.add_all`
+
+pydantic
+Pydantic models (tests/test_pydantic.py) persisted with SQLAlchemy core
+
+The mappings themselves live in benchmark_strategies.py.
+
+Every strategy uses an in-memory SQLite database and a graph of users with
+`--dogs` dogs each. Measured per graph size:
+
+insert      persisting the prebuilt domain objects (commit included)
+load        loading all users with their dogs into domain objects
+round_trip  building, inserting and loading again in a fresh session
+memory      bytes per loaded domain object (tracemalloc)
+
+and once per strategy:
+
+startup_import     importing what the strategy needs in a bare interpreter
+startup_configure  creating and configuring its mappings afterwards
+
+Timings are the best of `--repeat` runs. Output is one JSON object per line.
+
+How to run:
+
+$ python -m mapping_benchmark run
+
+$ python -m mapping_benchmark run --sizes 10,100,1000 --dogs 5 --repeat 3
+"""
+
+import abc as _abc
+import json
+import subprocess
+import sys
+import time as _time
+import tracemalloc
+from typing import Tuple
+
+import sqlalchemy as _sa
+import sqlalchemy.orm as _orm
+
+import click
+
+import benchmark_strategies as _benchmark_strategies
+
+
+@click.group()
+def main():
+    pass
+
+
+class Strategy(_abc.ABC):
+    name: str
+    # what the startup measurement imports and calls in a fresh interpreter
+    imports: Tuple[str, ...]
+    configure_function: str
+
+    @_abc.abstractmethod
+    def configure(self):
+        """
+        Creates the mapping, returns its metadata
+        """
+
+    @_abc.abstractmethod
+    def build(self, n_users, n_dogs):
+        pass
+
+    @_abc.abstractmethod
+    def insert(self, Session, users):
+        pass
+
+    @_abc.abstractmethod
+    def load(self, Session):
+        """
+        Returns all users with their dogs loaded
+        """
+
+
+class Imperative(Strategy):
+    name = "imperative"
+    imports = ("sqlalchemy.orm",)
+    configure_function = "configure_imperative"
+
+    def configure(self):
+        self.DomainUser, self.DomainDog, metadata = (
+            _benchmark_strategies.configure_imperative()
+        )
+        return metadata
+
+    def build(self, n_users, n_dogs):
+        users = []
+        for i in range(n_users):
+            user = self.DomainUser(name=f"user{i}")
+            for j in range(n_dogs):
+                # the backref adds the dog to `user.dogs`
+                self.DomainDog(nom=f"dog{i}-{j}", owner=user)
+            users.append(user)
+        return users
+
+    def insert(self, Session, users):
+        session = Session()
+        session.add_all(users)
+        session.commit()
+
+    def load(self, Session):
+        session = Session()
+        return (
+            session.query(self.DomainUser)
+            .options(_orm.selectinload(self.DomainUser.dogs))
+            .all()
+        )
+
+
+class Twin(Strategy):
+    name = "twin"
+    imports = ("sqlalchemy.orm", "twin_mapping")
+    configure_function = "configure_twin"
+
+    def configure(self):
+        self.DomainUser, self.DomainDog, self.Mapper, metadata = (
+            _benchmark_strategies.configure_twin()
+        )
+        return metadata
+
+    def build(self, n_users, n_dogs):
+        users = []
+        for i in range(n_users):
+            user = self.DomainUser(name=f"user{i}")
+            user.dogs = [
+                self.DomainDog(name=f"dog{i}-{j}", owner=user) for j in range(n_dogs)
+            ]
+            users.append(user)
+        return users
+
+    def insert(self, Session, users):
+        session = self.Mapper(Session())
+        for user in users:
+            session.add(user)
+        session.commit()
+
+    def load(self, Session):
+        session = self.Mapper(Session(), batch_load=True)
+        users = list(map(session.to_domain, session.query(self.DomainUser)))
+        for user in users:
+            len(user.dogs)
+        return users
+
+
+class TwinBulk(Twin):
+    name = "twin_bulk"
+
+    def insert(self, Session, users):
+        session = self.Mapper(Session())
+        session.add_all(users)
+        session.commit()
+
+
+class Pydantic(Strategy):
+    name = "pydantic"
+    imports = ("pydantic", "sqlalchemy")
+    configure_function = "configure_pydantic"
+
+    def configure(self):
+        (
+            self.PydanticUser,
+            self.PydanticDog,
+            self.user_table,
+            self.dog_table,
+            metadata,
+        ) = _benchmark_strategies.configure_pydantic()
+        return metadata
+
+    def build(self, n_users, n_dogs):
+        return [
+            self.PydanticUser(
+                name=f"user{i}",
+                dogs=[self.PydanticDog(name=f"dog{i}-{j}") for j in range(n_dogs)],
+            )
+            for i in range(n_users)
+        ]
+
+    def insert(self, Session, users):
+        session = Session()
+        dog_rows = []
+        for user in users:
+            result = session.execute(self.user_table.insert(), dict(name=user.name))
+            user.id = result.inserted_primary_key[0]
+            dog_rows.extend(dict(name=dog.name, owner_id=user.id) for dog in user.dogs)
+        if dog_rows:
+            session.execute(self.dog_table.insert(), dog_rows)
+        session.commit()
+
+    def load(self, Session):
+        session = Session()
+        dogs = {}
+        for row in session.execute(self.dog_table.select()).mappings():
+            dogs.setdefault(row["owner_id"], []).append(row)
+        return [
+            self.PydanticUser(
+                id=row["id"], name=row["name"], dogs=dogs.get(row["id"], [])
+            )
+            for row in session.execute(self.user_table.select()).mappings()
+        ]
+
+
+STRATEGIES = [Imperative, Twin, TwinBulk, Pydantic]
+
+
+def fresh_database(strategy):
+    metadata = strategy.configure()
+    engine = _sa.create_engine("sqlite:///:memory:")
+    metadata.create_all(engine)
+    return _orm.sessionmaker(bind=engine)
+
+
+def measure_insert(strategy, repeat, n_users, n_dogs):
+    timings = []
+    for _ in range(repeat):
+        Session = fresh_database(strategy)
+        users = strategy.build(n_users, n_dogs)
+        start = _time.perf_counter()
+        strategy.insert(Session, users)
+        timings.append(_time.perf_counter() - start)
+    return min(timings)
+
+
+def measure_load(strategy, repeat, n_users, n_dogs):
+    timings = []
+    for _ in range(repeat):
+        Session = fresh_database(strategy)
+        strategy.insert(Session, strategy.build(n_users, n_dogs))
+        start = _time.perf_counter()
+        strategy.load(Session)
+        timings.append(_time.perf_counter() - start)
+    return min(timings)
+
+
+def measure_round_trip(strategy, repeat, n_users, n_dogs):
+    timings = []
+    for _ in range(repeat):
+        Session = fresh_database(strategy)
+        start = _time.perf_counter()
+        strategy.insert(Session, strategy.build(n_users, n_dogs))
+        strategy.load(Session)
+        timings.append(_time.perf_counter() - start)
+    return min(timings)
+
+
+def measure_memory(strategy, n_users, n_dogs):
+    Session = fresh_database(strategy)
+    strategy.insert(Session, strategy.build(n_users, n_dogs))
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        users = strategy.load(Session)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    n_objects = len(users) + sum(len(user.dogs) for user in users)
+    return (after - before) / n_objects
+
+
+# runs in a bare interpreter, prints the import and the configuration time
+STARTUP_CODE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for module in {imports!r}:
+    importlib.import_module(module)
+imported = time.perf_counter()
+import benchmark_strategies
+benchmark_strategies.{configure_function}()
+if "sqlalchemy.orm" in sys.modules:
+    sys.modules["sqlalchemy.orm"].configure_mappers()
+print(json.dumps([imported - start, time.perf_counter() - imported]))
+"""
+
+
+def measure_startup(strategy, repeat):
+    """
+    Returns the best import and configuration times in seconds
+    """
+    code = STARTUP_CODE.format(
+        imports=strategy.imports, configure_function=strategy.configure_function
+    )
+    timings = [
+        json.loads(subprocess.check_output([sys.executable, "-c", code], text=True))
+        for _ in range(repeat)
+    ]
+    return min(imports for imports, _ in timings), min(
+        configure for _, configure in timings
+    )
+
+
+def record(strategy, metric, value, unit, n_users=None, n_dogs=None):
+    result = dict(strategy=strategy.name, metric=metric, value=value, unit=unit)
+    if n_users is not None:
+        result.update(users=n_users, objects=n_users * (1 + n_dogs))
+    click.echo(json.dumps(result))
+
+
+@main.command()
+@click.option("--sizes", default="10,100,1000", help="Comma separated user counts")
+@click.option("--dogs", default=5, help="Dogs per user")
+@click.option("--repeat", default=3, help="Runs per measurement, the best counts")
+@click.option(
+    "--strategy",
+    "names",
+    multiple=True,
+    type=click.Choice([cls.name for cls in STRATEGIES]),
+    help="Only run these strategies",
+)
+def run(sizes, dogs, repeat, names):
+    for cls in STRATEGIES:
+        if names and cls.name not in names:
+            continue
+        strategy = cls()
+        import_seconds, configure_seconds = measure_startup(cls, repeat)
+        record(strategy, "startup_import", import_seconds, "s")
+        record(strategy, "startup_configure", configure_seconds, "s")
+        for n_users in map(int, sizes.split(",")):
+            n_objects = n_users * (1 + dogs)
+            for metric, measure in [
+                ("insert", measure_insert),
+                ("load", measure_load),
+                ("round_trip", measure_round_trip),
+            ]:
+                seconds = measure(strategy, repeat, n_users, dogs)
+                record(strategy, metric, seconds, "s", n_users, dogs)
+                record(
+                    strategy,
+                    f"{metric}_throughput",
+                    n_objects / seconds,
+                    "objects/s",
+                    n_users,
+                    dogs,
+                )
+            bytes_per_object = measure_memory(strategy, n_users, dogs)
+            record(strategy, "memory", bytes_per_object, "bytes/object", n_users, dogs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
-from typing import Optional
+import decimal as _decimal
+import os as _os
+import time as _time
+from typing import List, Literal, Optional
 from unittest import mock
 import pydantic as _pydantic
 import pytest as _pytest
 
+from value_types import ValueType
+
 
 class D(_pydantic.BaseModel):
     pass
@@ -22,25 +27,14 @@ def test_pass_mock():
         C(something=mock.create_autospec(D))
 
 
-class WithValidator:
+class WithValidator(ValueType):
+    amount: _decimal.Decimal
+    currency: Literal["EUR", "USD"]
+
     def __init__(self, amount, currency):
         self.amount = amount
         self.currency = currency
 
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
-
-    @classmethod
-    def validate(cls, values):
-        import decimal
-
-        assert "amount" in values
-        assert "currency" in values
-        assert values["currency"] in ["EUR", "USD"]
-        amount = _pydantic.parse_obj_as(decimal.Decimal, values["amount"])
-        return cls(amount, values["currency"])
-
     def __repr__(self):
         return f"<WithValidator amount={self.amount} currency={self.currency}>"
 
@@ -51,6 +45,83 @@ def test_validator():
 
     print(X(le_attr=dict(amount=1.1, currency="EUR")))
 
+    with _pytest.raises(_pydantic.ValidationError) as exc_info:
+        X(le_attr=dict(amount="x", currency="GBP"))
+    assert [error["loc"] for error in exc_info.value.errors()] == [
+        ("le_attr", "amount"),
+        ("le_attr", "currency"),
+    ]
+
+
+def test_validate_many():
+    values = WithValidator.validate_many(
+        [dict(amount="1.10", currency="EUR"), dict(amount=2, currency="USD")]
+    )
+    assert [(v.amount, v.currency) for v in values] == [
+        (_decimal.Decimal("1.10"), "EUR"),
+        (_decimal.Decimal(2), "USD"),
+    ]
+
+    with _pytest.raises(_pydantic.ValidationError) as exc_info:
+        WithValidator.validate_many([dict(amount=1, currency="EUR"), dict(amount=1)])
+    assert [error["loc"] for error in exc_info.value.errors()] == [(1, "currency")]
+
+
+def test_value_type_components():
+    class Batch(ValueType):
+        xs: List[int]
+        label: str = "none"
+
+    batch = Batch.validate({"xs": ["1", 2]})
+    assert (batch.xs, batch.label) == ([1, 2], "none")
+
+    with _pytest.raises(_pydantic.ValidationError) as exc_info:
+        Batch.validate({"xs": [1, "a", "b"]})
+    assert [error["loc"] for error in exc_info.value.errors()] == [
+        ("xs", 1),
+        ("xs", 2),
+    ]
+
+    with _pytest.raises(_pydantic.ValidationError) as exc_info:
+        Batch.validate_many([{"xs": []}, {"xs": ["a"]}, {}])
+    assert [error["loc"] for error in exc_info.value.errors()] == [
+        (1, "xs", 0),
+        (2, "xs"),
+    ]
+
+
+@_pytest.mark.skipif(
+    not _os.environ.get("BENCHMARK"), reason="set BENCHMARK=1 to run benchmarks"
+)
+def test_validate_benchmark():
+    """
+    Validates 100k payloads with `parse_obj_as` per value and with `ValueType`
+    """
+
+    def validate_with_parse_obj_as(values):
+        assert "amount" in values
+        assert "currency" in values
+        assert values["currency"] in ["EUR", "USD"]
+        amount = _pydantic.parse_obj_as(_decimal.Decimal, values["amount"])
+        return WithValidator(amount, values["currency"])
+
+    payloads = [dict(amount=f"{i}.50", currency="EUR") for i in range(100_000)]
+
+    start = _time.perf_counter()
+    expected = list(map(validate_with_parse_obj_as, payloads))
+    print(f"parse_obj_as: {_time.perf_counter() - start:.3f}s")
+
+    start = _time.perf_counter()
+    values = list(map(WithValidator.validate, payloads))
+    print(f"validate: {_time.perf_counter() - start:.3f}s")
+
+    start = _time.perf_counter()
+    values_many = WithValidator.validate_many(payloads)
+    print(f"validate_many: {_time.perf_counter() - start:.3f}s")
+
+    assert [v.amount for v in values] == [v.amount for v in expected]
+    assert [v.amount for v in values_many] == [v.amount for v in expected]
+
 
 class WithSchema(WithValidator):
     @classmethod
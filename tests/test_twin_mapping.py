@@ -1,197 +1,667 @@
-from typing import List, Optional, Tuple, Type
+import asyncio as _asyncio
+import os as _os
+import time as _time
+from typing import List
 
 import dataclasses as _dc
-import inflection as _inflection
 
 import sqlalchemy as _sa
 import sqlalchemy.orm as _orm
+import sqlalchemy.ext.asyncio as _sa_asyncio
 
 import pytest as _pytest
 
+from benchmark_strategies import configure_twin
+from twin_mapping import (
+    AsyncTwinMapper,
+    LazyProxy,
+    MemoryBackend,
+    SecondLevelCache,
+    TwinMapper,
+    WalrusBackend,
+)
 
-def delegate_to(attr_name: str):
-    def _inner(cls):
-        def fn(self, name):
-            return getattr(getattr(self, attr_name), name)
 
-        cls.__getattr__ = fn
-        return cls
+def setup():
+    # the benchmark times the same mapping
+    return configure_twin()
+
+
+def test_works():
+    DomainUser, DomainDog, Mapper, metadata = setup()
+
+    engine = _sa.create_engine("sqlite:///:memory:")
+    # engine = _sa.create_engine("sqlite:///:memory:", echo=True)
+    Session = _orm.sessionmaker(bind=engine)
+
+    metadata.create_all(engine)
+
+    session = Mapper(Session())
+    usr = DomainUser(name="a")
+    # session.add(usr)
+    session.add(DomainDog(name="fifi", owner=usr))
+    session.add(DomainDog(name="fifi"))
+    session.commit()
+
+    session = Mapper(Session())
+    user = session.query(DomainUser).first()
+    print(user)
+    print(session.to_domain(user))
 
-    return _inner
+    dog = session.query(DomainDog).first()
+    print(dog)
+    print(session.to_domain(dog))
 
 
-@delegate_to("session")
-class TwinMapper:
-    mapping: List[Tuple[Type, Type]]
+def setup_dataclass():
+    # the twin maps are keyed by identity, so no generated __eq__/__hash__ = None
+    @_dc.dataclass(eq=False)
+    class DomainDog:
+        id: int = None
+        nom: str = None
+        owner: "DomainUser" = None
 
-    def __init__(self, session):
-        self.session = session
+    @_dc.dataclass(eq=False)
+    class DomainUser:
+        id: int = None
+        name: str = None
+        dogs: List[DomainDog] = _dc.field(default_factory=list)
 
-        self._domain_to_orm = {}
-        self._orm_to_domain = {}
-        self._domain_to_orm_classes = {
-            domain_cls: orm_cls for domain_cls, orm_cls in self.mapping
-        }
-        self._orm_to_domain_classes = {
-            orm_cls: domain_cls for domain_cls, orm_cls in self.mapping
-        }
+    _, _, Mapper, metadata = setup()
+    (_, OrmUser), (_, OrmDog) = Mapper.mapping
 
-    def add(self, domain_obj):
-        orm_cls = self.get_orm_cls(domain_obj)
-        orm_obj = orm_cls()
-        self._add_twin(domain_obj, orm_obj)
-        self._update_orm(domain_obj, orm_obj)
-        self.session.add(orm_obj)
+    class DataclassTwinMapper(TwinMapper):
+        mapping = [
+            (DomainUser, OrmUser),
+            (DomainDog, OrmDog),
+        ]
+        fields = {DomainDog: {"nom": "name"}}
 
-    def query(self, domain_cls):
-        orm_cls = self.get_orm_cls(domain_cls)
-        return self.session.query(orm_cls)
+    return DomainUser, DomainDog, DataclassTwinMapper, metadata
 
-    def to_domain(self, orm_obj):
-        if orm_obj is None:
-            return None
 
-        if orm_obj not in self._orm_to_domain:
-            domain_cls = self.get_domain_cls(orm_obj)
-            domain_obj = domain_cls()
-            self._orm_to_domain[orm_obj] = domain_obj
-            self._update_domain(orm_obj, domain_obj)
-        return self._orm_to_domain[orm_obj]
+def test_declarative_fields():
+    DomainUser, DomainDog, Mapper, metadata = setup_dataclass()
 
-    def to_orm(self, domain_obj):
-        if domain_obj is None:
-            return None
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
 
-        if domain_obj not in self._domain_to_orm:
-            orm_cls = self.get_orm_cls(domain_obj)
-            orm_obj = orm_cls()
-            self._domain_to_orm[domain_obj] = orm_obj
-            self._update_orm(domain_obj, orm_obj)
-        return self._domain_to_orm[domain_obj]
+    metadata.create_all(engine)
 
-    def get_orm_cls(self, obj_or_class):
-        if isinstance(obj_or_class, type):
-            return self._domain_to_orm_classes[obj_or_class]
-        return self._domain_to_orm_classes[obj_or_class.__class__]
+    session = Mapper(Session())
+    usr = DomainUser(name="a")
+    usr.dogs.append(DomainDog(nom="fifi", owner=usr))
+    session.add(usr)
+    session.commit()
 
-    def get_domain_cls(self, obj_or_class):
-        if isinstance(obj_or_class, type):
-            return self._orm_to_domain_classes[obj_or_class]
-        return self._orm_to_domain_classes[obj_or_class.__class__]
+    session = Mapper(Session())
+    dog = session.to_domain(session.query(DomainDog).one())
+    assert dog.nom == "fifi"
+    assert dog.owner.name == "a"
+    assert dog.owner.dogs == [dog]
 
-    def _add_twin(self, domain_obj, orm_obj):
-        self._domain_to_orm[domain_obj] = orm_obj
-        self._orm_to_domain[orm_obj] = domain_obj
 
-    def _update_orm(self, domain_obj, orm_obj):
-        domain_cls_name = _inflection.underscore(domain_obj.__class__.__name__)
+def test_hand_written_map_method_wins():
+    DomainUser, DomainDog, Mapper, metadata = setup()
 
-        mapper = getattr(self, f"map_{domain_cls_name}")
-        mapper(domain_obj, orm_obj)
+    class ShoutingTwinMapper(Mapper):
+        def map_orm_user(self, orm_user, domain_user):
+            domain_user.name = orm_user.name.upper()
 
-    def _update_domain(self, orm_obj, domain_obj):
-        orm_cls_name = _inflection.underscore(orm_obj.__class__.__name__)
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
 
-        mapper = getattr(self, f"map_{orm_cls_name}")
-        mapper(orm_obj, domain_obj)
+    metadata.create_all(engine)
 
+    session = ShoutingTwinMapper(Session())
+    session.add(DomainUser(name="a"))
+    session.commit()
 
-def setup():
-    class DomainDog:
-        id: int
-        name: str
-        owner: "DomainUser"
+    session = ShoutingTwinMapper(Session())
+    assert session.to_domain(session.query(DomainUser).one()).name == "A"
 
-        def __init__(self, id=None, name=None, owner=None):
-            self.id = id
+
+def test_missing_or_unknown_fields():
+    DomainUser, DomainDog, Mapper, metadata = setup()
+    (_, OrmUser), (_, OrmDog) = Mapper.mapping
+
+    class UnmappedTwinMapper(TwinMapper):
+        mapping = Mapper.mapping
+
+    class TypoTwinMapper(Mapper):
+        fields = {**Mapper.fields, DomainDog: {"id": "id", "name": "nmae"}}
+
+    session = UnmappedTwinMapper(_orm.Session())
+    with _pytest.raises(ValueError, match="map_orm_user"):
+        session.to_domain(OrmUser())
+
+    session = TypoTwinMapper(_orm.Session())
+    with _pytest.raises(ValueError, match="nmae"):
+        session.to_domain(OrmDog())
+
+
+def test_add_all_renamed_primary_key():
+    _, _, Mapper, metadata = setup()
+    (_, OrmUser), _ = Mapper.mapping
+
+    class RenamedUser:
+        def __init__(self, ident=None, name=None):
+            self.ident = ident
             self.name = name
-            self.owner = owner
 
-    class DomainUser:
-        id: int
-        name: str
-        dogs: List[DomainDog]
+    class RenamedTwinMapper(TwinMapper):
+        mapping = [(RenamedUser, OrmUser)]
+        fields = {RenamedUser: {"ident": "id", "name": "name"}}
 
-        def __init__(self, id=None, name=None, dogs=None):
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
+
+    metadata.create_all(engine)
+
+    session = RenamedTwinMapper(Session())
+    users = [RenamedUser(name="a"), RenamedUser(name="b")]
+    session.add_all(users)
+    session.commit()
+
+    assert [user.ident for user in users] == [1, 2]
+    assert not any(hasattr(user, "id") for user in users)
+
+
+def test_add_all_hand_written_map_methods():
+    _, _, Mapper, metadata = setup()
+    (_, OrmUser), _ = Mapper.mapping
+
+    class PlainUser:
+        def __init__(self, id=None, name=None):
             self.id = id
             self.name = name
-            self.dogs = dogs or []
-
-    mapper_registry = _orm.registry()
-    user_table = _sa.Table(
-        "user",
-        mapper_registry.metadata,
-        _sa.Column("id", _sa.Integer, primary_key=True),
-        _sa.Column("name", _sa.String(50)),
+
+    class HandWrittenTwinMapper(TwinMapper):
+        mapping = [(PlainUser, OrmUser)]
+
+        def map_plain_user(self, domain_user, orm_user):
+            orm_user.name = domain_user.name
+
+        def map_orm_user(self, orm_user, domain_user):
+            domain_user.id = orm_user.id
+            domain_user.name = orm_user.name
+
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
+
+    metadata.create_all(engine)
+
+    session = HandWrittenTwinMapper(Session())
+    users = [PlainUser(name="a"), PlainUser(name="b")]
+    session.add_all(users)
+    session.commit()
+
+    assert [user.id for user in users] == [1, 2]
+
+
+def count_statements(engine):
+    statements = []
+    _sa.event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
     )
+    return statements
+
+
+def setup_users(n_users, n_dogs):
+    DomainUser, DomainDog, Mapper, metadata = setup()
+
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
+
+    metadata.create_all(engine)
+
+    session = Mapper(Session())
+    session.add_all(make_users(DomainUser, DomainDog, n_users, n_dogs))
+    session.commit()
+    return DomainUser, DomainDog, Mapper, Session, count_statements(engine)
+
 
-    dog_table = _sa.Table(
-        "dog",
-        mapper_registry.metadata,
-        _sa.Column("id", _sa.Integer, primary_key=True),
-        _sa.Column("name", _sa.String(50)),
-        _sa.Column("owner_id", _sa.Integer, _sa.ForeignKey(user_table.c.id)),
+def test_lazy_relationships():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(3, 2)
+
+    session = Mapper(Session())
+    dog = session.to_domain(session.query(DomainDog).first())
+    assert len(statements) == 1
+
+    assert isinstance(dog.owner, LazyProxy)
+    assert dog.owner.name == "user0"
+    assert len(statements) == 2
+    # the proxy replaced itself
+    assert isinstance(dog.owner, DomainUser)
+    assert dog in dog.owner.dogs
+    assert len(statements) == 3
+
+
+# batched: one query re-selecting the parents, one selectinload for the dogs
+@_pytest.mark.parametrize("batch_load, expected", [(False, 3), (True, 2)])
+def test_batch_load(batch_load, expected):
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(3, 2)
+
+    session = Mapper(Session(), batch_load=batch_load)
+    users = list(map(session.to_domain, session.query(DomainUser)))
+    statements.clear()
+
+    assert [len(user.dogs) for user in users] == [2, 2, 2]
+    assert len(statements) == expected
+    assert all(dog.owner is user for user in users for dog in user.dogs)
+    assert len(statements) == expected
+
+
+@_pytest.mark.parametrize("batch_load", [False, True])
+def test_batch_load_join_condition(batch_load):
+    _, DomainDog, Mapper, metadata = setup()
+    (_, OrmUser), (_, OrmDog) = Mapper.mapping
+    user_table, dog_table = OrmUser.__table__, OrmDog.__table__
+    _orm.class_mapper(OrmUser).add_property(
+        "good_dogs",
+        _orm.relationship(
+            OrmDog,
+            primaryjoin=_sa.and_(
+                user_table.c.id == dog_table.c.owner_id, dog_table.c.name == "good"
+            ),
+            viewonly=True,
+        ),
     )
 
-    class OrmDog:
+    class GoodUser:
         pass
 
-    class OrmUser:
+    class GoodTwinMapper(Mapper):
+        mapping = [(GoodUser, OrmUser), (DomainDog, OrmDog)]
+        fields = {**Mapper.fields, GoodUser: {"good_dogs": "good_dogs"}}
+
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
+
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(user_table.insert(), [dict(id=1), dict(id=2)])
+        conn.execute(
+            dog_table.insert(),
+            [
+                dict(name="good", owner_id=1),
+                dict(name="bad", owner_id=1),
+                dict(name="good", owner_id=2),
+            ],
+        )
+
+    session = GoodTwinMapper(Session(), batch_load=batch_load)
+    users = list(map(session.to_domain, session.query(GoodUser).order_by("id")))
+    assert [[dog.name for dog in user.good_dogs] for user in users] == [
+        ["good"],
+        ["good"],
+    ]
+
+
+def test_unloaded_siblings_are_released():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(3, 1)
+
+    session = Mapper(Session(), batch_load=True)
+    orm_users = session.query(DomainUser).all()
+    users = list(map(session.to_domain, orm_users))
+    siblings = session._unloaded[orm_users[0].__class__, "dogs"]
+    assert len(siblings) == 3
+
+    # replaced lazy values and expunged twins are no longer batch loaded
+    users[0].dogs = []
+    session.expunge(orm_users[1])
+    assert list(siblings) == [orm_users[2]]
+
+
+def test_second_level_cache():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(2, 1)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache()
+        cache_classes = [DomainUser]
+
+    session = CachedTwinMapper(Session())
+    assert session.get(DomainUser, 1).name == "user0"
+    assert len(statements) == 1
+    # loaded rows are cached once their transaction commits
+    session.commit()
+
+    statements.clear()
+    session = CachedTwinMapper(Session())
+    user = session.get(DomainUser, 1)
+    assert user.name == "user0"
+    assert not statements
+    # the cached twin is persistent, relationships still load
+    assert [dog.name for dog in user.dogs] == ["dog0-0"]
+
+    # many-to-one relationships are served from the cache as well
+    session = CachedTwinMapper(Session())
+    dog = session.to_domain(session.query(DomainDog).first())
+    statements.clear()
+    assert dog.owner.name == "user0"
+    assert not statements
+    assert CachedTwinMapper.cache.hits == 2
+
+    session.to_orm(dog.owner).name = "renamed"
+    session.commit()
+
+    statements.clear()
+    session = CachedTwinMapper(Session())
+    assert session.get(DomainUser, 1).name == "renamed"
+    assert len(statements) == 1
+    assert CachedTwinMapper.cache.hit_rate == 2 / 4
+
+
+def test_second_level_cache_is_lazy():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(10, 10)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache()
+        cache_classes = [DomainUser]
+
+    session = CachedTwinMapper(Session())
+    dogs = list(map(session.to_domain, session.query(DomainDog)))
+    assert len(dogs) == 100
+    # converting does not look up the owners
+    assert CachedTwinMapper.cache.hits + CachedTwinMapper.cache.misses == 0
+
+
+def test_second_level_cache_stale_write():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(1, 0)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache()
+        cache_classes = [DomainUser]
+
+    session_a = CachedTwinMapper(Session())
+    orm_user = session_a.query(DomainUser).one()
+
+    session_b = CachedTwinMapper(Session())
+    session_b.to_orm(session_b.get(DomainUser, 1)).name = "new"
+    session_b.commit()
+
+    # the older row read by session A must not refill the cache
+    session_a.to_domain(orm_user)
+    session_a.commit()
+    assert CachedTwinMapper(Session()).get(DomainUser, 1).name == "new"
+
+
+@_pytest.mark.parametrize("change", ["flush", "execute"])
+def test_second_level_cache_rollback(change):
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(1, 0)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache()
+        cache_classes = [DomainUser]
+
+    session = CachedTwinMapper(Session())
+    if change == "flush":
+        session.to_orm(session.get(DomainUser, 1)).name = "uncommitted"
+        session.flush()
+        session.expunge_all()
+    else:
+        session.execute(_sa.text("UPDATE user SET name = 'uncommitted'"))
+    session.query(DomainUser).all()
+    session.rollback()
+
+    assert CachedTwinMapper(Session()).get(DomainUser, 1).name == "user0"
+
+
+def test_second_level_cache_savepoint_rollback():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(1, 0)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache()
+        cache_classes = [DomainUser]
+
+    session = CachedTwinMapper(Session())
+    session.get(DomainUser, 1)
+    session.commit()
+
+    session = CachedTwinMapper(Session())
+    session.to_orm(session.get(DomainUser, 1)).name = "renamed"
+    session.flush()
+    session.begin_nested()
+    session.rollback()
+    session.commit()
+
+    assert CachedTwinMapper(Session()).get(DomainUser, 1).name == "renamed"
+
+
+def test_second_level_cache_classes():
+    DomainUser, DomainDog, Mapper, Session, statements = setup_users(2, 2)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache()
+        cache_classes = [DomainUser]
+
+    session = CachedTwinMapper(Session())
+    session.query(DomainUser).all()
+    session.query(DomainDog).all()
+    session.commit()
+
+    backend = CachedTwinMapper.cache.backend
+    assert [domain_cls for domain_cls, _ in backend._entries] == [
+        DomainUser,
+        DomainUser,
+    ]
+
+
+def test_walrus_backend():
+    class FakeWalrusCache:
+        def __init__(self):
+            self.data = {}
+            self.calls = []
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def set(self, key, value, timeout=None):
+            self.calls.append((key, value, timeout))
+            self.data[key] = value
+
+        def delete(self, key):
+            self.data.pop(key, None)
+
+    class Money:
         pass
 
-    mapper_registry.map_imperatively(OrmUser, user_table)
-    mapper_registry.map_imperatively(
-        OrmDog,
-        dog_table,
-        properties={"owner": _orm.relationship(OrmUser, backref="dogs")},
+    walrus_cache = FakeWalrusCache()
+    cache = SecondLevelCache(WalrusBackend(walrus_cache, ttl=60))
+
+    cache.set(Money, (1, "EUR"), {"amount": 1})
+    key = f"{__name__}.test_walrus_backend.<locals>.Money:1:EUR"
+    assert walrus_cache.calls == [(key, {"amount": 1}, 60)]
+    assert cache.get(Money, (1, "EUR")) == {"amount": 1}
+
+    cache.invalidate(Money, (1, "EUR"))
+    assert cache.get(Money, (1, "EUR")) is None
+    assert cache.hit_rate == 1 / 2
+
+
+def test_memory_backend_eviction():
+    now = [0]
+    backend = MemoryBackend(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache = SecondLevelCache(backend)
+
+    cache.set(object, (1,), "a")
+    cache.set(object, (2,), "b")
+    assert cache.get(object, (1,)) == "a"
+    cache.set(object, (3,), "c")
+    assert cache.get(object, (2,)) is None
+    assert cache.evictions == 1
+
+    now[0] = 10
+    assert cache.get(object, (1,)) is None
+    assert cache.expirations == 1
+    assert cache.hit_rate == 1 / 3
+
+
+def test_async():
+    DomainUser, DomainDog, Mapper, metadata = setup()
+
+    class AsyncMapper(AsyncTwinMapper):
+        twin_mapper = Mapper
+
+    engine = _sa_asyncio.create_async_engine("sqlite+aiosqlite:///:memory:")
+    Session = _orm.sessionmaker(
+        bind=engine, class_=_sa_asyncio.AsyncSession, expire_on_commit=False
     )
 
-    class ConcreteTwinMapper(TwinMapper):
-        mapping = [
-            (DomainUser, OrmUser),
-            (DomainDog, OrmDog),
-        ]
+    with _pytest.raises(_sa.exc.InvalidRequestError):
+        AsyncMapper(_sa_asyncio.AsyncSession(engine))
+
+    async def load_user(ident):
+        async with Session() as async_session:
+            session = AsyncMapper(async_session)
+            user = await session.get(DomainUser, ident)
+            with _pytest.raises(_sa.exc.InvalidRequestError):
+                len(user.dogs)
+            await session.load([user], "dogs")
+            return user.name, [dog.name for dog in user.dogs]
+
+    async def main():
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+        async with Session() as async_session:
+            session = AsyncMapper(async_session)
+            await session.add_all(make_users(DomainUser, DomainDog, 3, 2))
+            await session.commit()
+
+        async with Session() as async_session:
+            session = AsyncMapper(async_session)
+            users = await session.query(DomainUser)
+            await session.load(users, "dogs")
+            dogs = [dog async for dog in session.stream(DomainDog)]
+            assert [dog for user in users for dog in user.dogs] == dogs
+            assert all(dog.owner is user for user in users for dog in user.dogs)
+
+            orm_user = (
+                await async_session.execute(session.select(DomainUser))
+            ).scalar()
+            async_session.expire(orm_user)
+            with _pytest.raises(_sa.exc.InvalidRequestError):
+                AsyncMapper(async_session).to_domain(orm_user)
+
+        results = await _asyncio.gather(*map(load_user, [1, 2, 3]))
+        await engine.dispose()
+        return results
+
+    assert _asyncio.run(main()) == [
+        (f"user{i}", [f"dog{i}-0", f"dog{i}-1"]) for i in range(3)
+    ]
+
+
+def test_async_does_not_use_the_cache():
+    DomainUser, DomainDog, Mapper, metadata = setup()
+
+    class SpyBackend(MemoryBackend):
+        calls = []
+
+        def get(self, key):
+            self.calls.append("get")
+            return super().get(key)
+
+        def set(self, key, value):
+            self.calls.append("set")
+            super().set(key, value)
+
+    class CachedTwinMapper(Mapper):
+        cache = SecondLevelCache(SpyBackend())
+        cache_classes = [DomainUser, DomainDog]
+
+    class AsyncMapper(AsyncTwinMapper):
+        twin_mapper = CachedTwinMapper
+
+    engine = _sa_asyncio.create_async_engine("sqlite+aiosqlite:///:memory:")
+    Session = _orm.sessionmaker(
+        bind=engine, class_=_sa_asyncio.AsyncSession, expire_on_commit=False
+    )
 
-        def map_domain_user(self, domain_user: DomainUser, orm_user: OrmUser):
-            orm_user.name = domain_user.name
-            orm_user.dogs = domain_user.dogs
+    async def main():
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
 
-        def map_domain_dog(self, domain_dog: DomainDog, orm_dog: OrmDog):
-            orm_dog.name = domain_dog.name
-            orm_dog.owner = self.to_orm(domain_dog.owner)
+        async with Session() as async_session:
+            session = AsyncMapper(async_session)
+            await session.add_all(make_users(DomainUser, DomainDog, 2, 1))
+            await session.commit()
 
-        def map_orm_user(self, orm_user: OrmUser, domain_user: DomainUser):
-            domain_user.name = orm_user.name
-            domain_user.dogs = list(map(self.to_domain, orm_user.dogs))
+        async with Session() as async_session:
+            session = AsyncMapper(async_session)
+            await session.query(DomainDog)
+            assert (await session.get(DomainUser, 1)).name == "user0"
+            await session.commit()
+        await engine.dispose()
 
-        def map_orm_dog(self, orm_dog: OrmDog, domain_dog: DomainDog):
-            domain_dog.name = orm_dog.name
-            domain_dog.owner = self.to_domain(orm_dog.owner)
+    _asyncio.run(main())
+    assert SpyBackend.calls == []
 
-    return DomainUser, DomainDog, ConcreteTwinMapper, mapper_registry
 
+def make_users(DomainUser, DomainDog, n_users, n_dogs):
+    users = []
+    for i in range(n_users):
+        user = DomainUser(name=f"user{i}")
+        user.dogs = [DomainDog(name=f"dog{i}-{j}", owner=user) for j in range(n_dogs)]
+        users.append(user)
+    return users
 
-def test_works():
-    DomainUser, DomainDog, Mapper, mapper_registry = setup()
+
+def test_add_all():
+    DomainUser, DomainDog, Mapper, metadata = setup()
 
     engine = _sa.create_engine("sqlite:///:memory:")
-    # engine = _sa.create_engine("sqlite:///:memory:", echo=True)
     Session = _orm.sessionmaker(bind=engine)
 
-    mapper_registry.metadata.create_all(engine)
+    metadata.create_all(engine)
 
     session = Mapper(Session())
-    usr = DomainUser(name="a")
-    # session.add(usr)
-    session.add(DomainDog(name="fifi", owner=usr))
-    session.add(DomainDog(name="fifi"))
+    users = make_users(DomainUser, DomainDog, 3, 2)
+    session.add_all(users)
     session.commit()
 
+    assert all(user.id is not None for user in users)
+    assert all(dog.id is not None for user in users for dog in user.dogs)
+
     session = Mapper(Session())
-    user = session.query(DomainUser).first()
-    print(user)
-    print(session.to_domain(user))
+    dogs = session.query(DomainDog).order_by("id").all()
+    assert [dog.name for dog in dogs] == [
+        dog.name for user in users for dog in user.dogs
+    ]
+    assert [dog.owner.id for dog in dogs] == [
+        user.id for user in users for _ in user.dogs
+    ]
+
+
+@_pytest.mark.skipif(
+    not _os.environ.get("BENCHMARK"), reason="set BENCHMARK=1 to run benchmarks"
+)
+def test_add_all_benchmark():
+    """
+    Compares the per-object `add` path to `add_all`
+    """
+    DomainUser, DomainDog, Mapper, metadata = setup()
 
-    dog = session.query(DomainDog).first()
-    print(dog)
-    print(session.to_domain(dog))
+    engine = _sa.create_engine("sqlite:///:memory:")
+    Session = _orm.sessionmaker(bind=engine)
+
+    metadata.create_all(engine)
+
+    def per_object(session, users):
+        for user in users:
+            session.add(user)
+
+    for name, add in [("add", per_object), ("add_all", Mapper.add_all)]:
+        session = Mapper(Session())
+        users = make_users(DomainUser, DomainDog, 200, 5)
+        start = _time.perf_counter()
+        add(session, users)
+        session.commit()
+        print(f"{name}: {_time.perf_counter() - start:.3f}s")
+
+    session = Mapper(Session())
+    assert session.query(DomainUser).count() == 400
+    assert session.query(DomainDog).count() == 2000
@@ -0,0 +1,792 @@
+"""
+Twin mapping: plain domain objects kept in sync with separate SQLAlchemy
+mapped "twin" objects, explored in tests/test_twin_mapping.py
+"""
+
+import collections as _collections
+import collections.abc as _abc
+import itertools as _itertools
+import threading as _threading
+import time as _time
+import weakref as _weakref
+from typing import Collection, Dict, List, Optional, Tuple, Type
+
+import dataclasses as _dc
+import inflection as _inflection
+
+import sqlalchemy as _sa
+import sqlalchemy.orm as _orm
+
+
+def delegate_to(attr_name: str):
+    def _inner(cls):
+        def fn(self, name):
+            return getattr(getattr(self, attr_name), name)
+
+        cls.__getattr__ = fn
+        return cls
+
+    return _inner
+
+
+class LazyList(_abc.MutableSequence):
+    """
+    Domain side of a to-many relationship, converted on first access
+    """
+
+    def __init__(self, mapper, orm_obj, key):
+        self._mapper = mapper
+        self._orm_obj = orm_obj
+        self._key = key
+        self._items = None
+
+    def _resolve(self):
+        if self._items is None:
+            self._items = self._mapper._load_relationship(self._orm_obj, self._key)
+        return self._items
+
+    def __getitem__(self, index):
+        return self._resolve()[index]
+
+    def __setitem__(self, index, value):
+        self._resolve()[index] = value
+
+    def __delitem__(self, index):
+        del self._resolve()[index]
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def insert(self, index, value):
+        self._resolve().insert(index, value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyList):
+            other = other._resolve()
+        return self._resolve() == other
+
+    def __repr__(self):
+        if self._items is None:
+            return f"<LazyList {self._key} (unloaded)>"
+        return repr(self._items)
+
+
+_UNRESOLVED = object()
+
+
+class LazyProxy:
+    """
+    Domain side of a to-one relationship, converted on first attribute access.
+
+    Once resolved the proxy replaces itself on the owning domain object.
+    """
+
+    __slots__ = (
+        "_mapper",
+        "_orm_obj",
+        "_key",
+        "_owner",
+        "_attr",
+        "_target",
+        "__weakref__",
+    )
+
+    def __init__(self, mapper, orm_obj, key, owner, attr):
+        object.__setattr__(self, "_mapper", mapper)
+        object.__setattr__(self, "_orm_obj", orm_obj)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_owner", owner)
+        object.__setattr__(self, "_attr", attr)
+        object.__setattr__(self, "_target", _UNRESOLVED)
+
+    def _resolve(self):
+        if self._target is not _UNRESOLVED:
+            return self._target
+
+        target = self._mapper._load_relationship(self._orm_obj, self._key)
+        object.__setattr__(self, "_target", target)
+        if getattr(self._owner, self._attr, None) is self:
+            setattr(self._owner, self._attr, target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyProxy):
+            other = other._resolve()
+        return self._resolve() == other
+
+    def __hash__(self):
+        return hash(self._resolve())
+
+    def __repr__(self):
+        return f"<LazyProxy {self._key}>"
+
+
+class MemoryBackend:
+    """
+    In-process LRU store with an optional time to live (in seconds), safe to
+    share between threads
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=_time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = _collections.OrderedDict()
+        self._lock = _threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires_at, value = self._entries[key]
+            except KeyError:
+                return None
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class WalrusBackend:
+    """
+    Store in redis through a `walrus.Cache`, e.g. `walrus.Database().cache()`.
+
+    Redis expires and evicts on its own, so there is nothing to count here.
+    """
+
+    evictions = 0
+    expirations = 0
+
+    def __init__(self, cache, ttl=None):
+        self.cache = cache
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key))
+
+    def _key(self, key):
+        domain_cls, ident = key
+        ident = ":".join(map(str, ident))
+        return f"{domain_cls.__module__}.{domain_cls.__qualname__}:{ident}"
+
+
+class SecondLevelCache:
+    """
+    Column values of persistent twins keyed by (domain class, primary key),
+    shared by all `TwinMapper` sessions that use it.
+
+    Every invalidation bumps `generation`. A row read in a transaction that
+    began at an older generation is not stored if its key has been
+    invalidated since, so a slow reader cannot put back a replaced value. The
+    last `max_invalidations` keys are remembered, rows older than that are
+    not stored at all. This only covers invalidations of this process.
+    """
+
+    def __init__(self, backend=None, max_invalidations=1024):
+        self.backend = MemoryBackend() if backend is None else backend
+        self.max_invalidations = max_invalidations
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._invalidated = _collections.OrderedDict()
+        self._forgotten = 0
+        self._lock = _threading.Lock()
+
+    def get(self, domain_cls, ident):
+        row = self.backend.get((domain_cls, ident))
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def set(self, domain_cls, ident, row, read_at=None):
+        """
+        Stores `row`, unless it was read at generation `read_at` and has been
+        invalidated since
+        """
+        key = (domain_cls, ident)
+        with self._lock:
+            if read_at is not None and (
+                read_at < self._forgotten or self._invalidated.get(key, 0) > read_at
+            ):
+                return
+            self.backend.set(key, row)
+
+    def invalidate(self, domain_cls, ident):
+        key = (domain_cls, ident)
+        with self._lock:
+            self.generation += 1
+            self._invalidated[key] = self.generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_invalidations:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+            self.backend.delete(key)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def evictions(self):
+        return self.backend.evictions
+
+    @property
+    def expirations(self):
+        return self.backend.expirations
+
+
+@delegate_to("session")
+class TwinMapper:
+    """
+    Keeps a domain object and its ORM twin in sync.
+
+    Conversions are looked up per class: a hand-written `map_<class name>`
+    method wins, otherwise one is generated from `fields`, which maps domain
+    attribute names to ORM attribute names (dataclass fields that match an ORM
+    attribute are mapped implicitly). ORM relationships are converted through
+    `to_orm`; towards the domain they become `LazyList`/`LazyProxy` values
+    that are only converted when accessed. With `batch_load` the first access
+    loads the same relationship for all siblings still waiting for it in one
+    query.
+
+    With a `cache`, `get` and resolving many-to-one relationships of the
+    domain classes in `cache_classes` are served from it before hitting the
+    database. Rows loaded in a transaction are stored when it commits, except
+    the ones the session changed; a rollback drops them. Committed changes
+    invalidate their entries. Without implicit IO the cache is neither read
+    nor filled, only invalidated on commit.
+    """
+
+    mapping: List[Tuple[Type, Type]]
+    fields: Dict[Type, Dict[str, str]] = {}
+    cache: Optional[SecondLevelCache] = None
+    cache_classes: Collection[Type] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._converters = {}
+
+    def __init__(self, session, batch_load=False, implicit_io=True):
+        self.session = session
+        self.batch_load = batch_load
+        self.implicit_io = implicit_io
+
+        self._domain_to_orm = {}
+        self._orm_to_domain = {}
+        self._unloaded = {}
+        self._created = None
+        self._domain_to_orm_classes = {
+            domain_cls: orm_cls for domain_cls, orm_cls in self.mapping
+        }
+        self._orm_to_domain_classes = {
+            orm_cls: domain_cls for domain_cls, orm_cls in self.mapping
+        }
+
+        _sa.event.listen(session, "persistent_to_detached", self._forget_unloaded)
+
+        self._cached_orm_classes = {
+            self._domain_to_orm_classes[domain_cls] for domain_cls in self.cache_classes
+        }
+        self._invalidations = set()
+        self._loaded_rows = {}
+        self._read_at = None
+        if self.cache is not None:
+            _sa.event.listen(session, "after_flush", self._collect_invalidations)
+            _sa.event.listen(session, "after_commit", self._commit_cache)
+            _sa.event.listen(session, "after_rollback", self._rollback_cache)
+            if implicit_io:
+                _sa.event.listen(session, "after_begin", self._begin_cache)
+                _sa.event.listen(session, "loaded_as_persistent", self._buffer_row)
+
+    def add(self, domain_obj):
+        orm_cls = self.get_orm_cls(domain_obj)
+        orm_obj = orm_cls()
+        self._add_twin(domain_obj, orm_obj)
+        self._update_orm(domain_obj, orm_obj)
+        self.session.add(orm_obj)
+
+    def add_all(self, domain_objs, batch_size=1000):
+        """
+        Bulk alternative to `add`: skips the unit of work and inserts the twins
+        class by class (parents first), then back-fills the generated primary
+        keys into twins and domain objects.
+        """
+        # also collects the twins `to_orm` creates for related objects
+        self._created = created = []
+        try:
+            for domain_obj in domain_objs:
+                if domain_obj not in self._domain_to_orm:
+                    orm_obj = self.get_orm_cls(domain_obj)()
+                    self._add_twin(domain_obj, orm_obj)
+                    self._update_orm(domain_obj, orm_obj)
+        finally:
+            self._created = None
+
+        pending = {}
+        for domain_obj, orm_obj in created:
+            if _sa.inspect(orm_obj).transient:
+                pending.setdefault(orm_obj.__class__, []).append((domain_obj, orm_obj))
+
+        mappers = {_orm.class_mapper(orm_cls): orm_cls for orm_cls in pending}
+        tables = {mapper.local_table: mapper for mapper in mappers}
+        for table in _sa.schema.sort_tables(tables):
+            mapper = tables[table]
+            twins = pending[mappers[mapper]]
+            rows = [self._bulk_row(mapper, orm_obj) for _, orm_obj in twins]
+            for start in range(0, len(rows), batch_size):
+                self.session.bulk_insert_mappings(
+                    mapper, rows[start : start + batch_size], return_defaults=True
+                )
+            domain_attrs = {
+                orm_attr: domain_attr
+                for domain_attr, orm_attr in self._field_spec(
+                    self.get_domain_cls(mappers[mapper])
+                ).items()
+            }
+            pk_keys = [
+                mapper.get_property_by_column(column).key
+                for column in mapper.primary_key
+            ]
+            for (domain_obj, orm_obj), row in zip(twins, rows):
+                for key in pk_keys:
+                    setattr(orm_obj, key, row[key])
+                    # hand-written converters have no spec, keep the ORM name
+                    setattr(domain_obj, domain_attrs.get(key, key), row[key])
+
+        # the rows exist now, so the twins can join the session as persistent
+        orm_objs = [orm_obj for twins in pending.values() for _, orm_obj in twins]
+        for orm_obj in orm_objs:
+            _orm.make_transient_to_detached(orm_obj)
+        self.session.add_all(orm_objs)
+
+    def query(self, domain_cls):
+        orm_cls = self.get_orm_cls(domain_cls)
+        return self.session.query(orm_cls)
+
+    def get(self, domain_cls, ident):
+        orm_cls = self.get_orm_cls(domain_cls)
+        ident = ident if isinstance(ident, tuple) else (ident,)
+        orm_obj = self._get_identity(
+            _orm.class_mapper(orm_cls), ident, use_cache=self.implicit_io
+        )
+        if orm_obj is None:
+            orm_obj = self.session.get(orm_cls, ident)
+        return self.to_domain(orm_obj)
+
+    def to_domain(self, orm_obj):
+        if orm_obj is None:
+            return None
+
+        if orm_obj not in self._orm_to_domain:
+            if not self.implicit_io and _sa.inspect(orm_obj).expired_attributes:
+                raise _sa.exc.InvalidRequestError(
+                    f"{orm_obj.__class__.__name__} is expired, converting it "
+                    "would refresh it implicitly"
+                )
+            domain_cls = self.get_domain_cls(orm_obj)
+            domain_obj = domain_cls()
+            self._add_twin(domain_obj, orm_obj)
+            self._update_domain(orm_obj, domain_obj)
+        return self._orm_to_domain[orm_obj]
+
+    def to_orm(self, domain_obj):
+        if isinstance(domain_obj, LazyProxy):
+            domain_obj = domain_obj._resolve()
+        if domain_obj is None:
+            return None
+
+        if domain_obj not in self._domain_to_orm:
+            orm_cls = self.get_orm_cls(domain_obj)
+            orm_obj = orm_cls()
+            self._add_twin(domain_obj, orm_obj)
+            self._update_orm(domain_obj, orm_obj)
+        return self._domain_to_orm[domain_obj]
+
+    def get_orm_cls(self, obj_or_class):
+        if isinstance(obj_or_class, type):
+            return self._domain_to_orm_classes[obj_or_class]
+        return self._domain_to_orm_classes[obj_or_class.__class__]
+
+    def get_domain_cls(self, obj_or_class):
+        if isinstance(obj_or_class, type):
+            return self._orm_to_domain_classes[obj_or_class]
+        return self._orm_to_domain_classes[obj_or_class.__class__]
+
+    def _add_twin(self, domain_obj, orm_obj):
+        self._domain_to_orm[domain_obj] = orm_obj
+        self._orm_to_domain[orm_obj] = domain_obj
+        if self._created is not None:
+            self._created.append((domain_obj, orm_obj))
+
+    def _lazy(self, orm_obj, key, uselist, domain_obj, attr):
+        if not uselist:
+            target = orm_obj.__dict__.get(key)
+            if target is None:
+                target = self._get_loaded_target(orm_obj, key)
+            if target is not None:
+                # already in memory, converting it does not cascade
+                return self.to_domain(target)
+
+        if uselist:
+            lazy = LazyList(self, orm_obj, key)
+        else:
+            lazy = LazyProxy(self, orm_obj, key, domain_obj, attr)
+        # weak, so siblings whose lazy value was replaced or dropped go away
+        siblings = self._unloaded.get((orm_obj.__class__, key))
+        if siblings is None:
+            siblings = self._unloaded[orm_obj.__class__, key] = (
+                _weakref.WeakValueDictionary()
+            )
+        siblings[orm_obj] = lazy
+        return lazy
+
+    def _forget_unloaded(self, session, orm_obj):
+        for siblings in self._unloaded.values():
+            siblings.pop(orm_obj, None)
+
+    def _get_loaded_target(self, orm_obj, key, use_cache=False):
+        # a many-to-one pointing at a primary key may already be in the session
+        rel = _orm.class_mapper(orm_obj.__class__).relationships[key]
+        local_by_remote = {remote: local for local, remote in rel.local_remote_pairs}
+        if rel.direction is not _orm.MANYTOONE or set(local_by_remote) != set(
+            rel.mapper.primary_key
+        ):
+            return None
+
+        ident = tuple(
+            getattr(orm_obj, rel.parent.get_property_by_column(local_by_remote[pk]).key)
+            for pk in rel.mapper.primary_key
+        )
+        return self._get_identity(rel.mapper, ident, use_cache)
+
+    def _get_identity(self, mapper, ident, use_cache=True):
+        """
+        The persistent object for `ident` from the session or the cache, no
+        database IO
+        """
+        identity_key = mapper.identity_key_from_primary_key(ident)
+        orm_obj = self.session.identity_map.get(identity_key)
+        if (
+            orm_obj is not None
+            or not use_cache
+            or self.cache is None
+            or mapper.class_ not in self._cached_orm_classes
+        ):
+            return orm_obj
+
+        row = self.cache.get(self.get_domain_cls(mapper.class_), ident)
+        if row is None:
+            return None
+        orm_obj = mapper.class_manager.new_instance()
+        for key, value in row.items():
+            _orm.attributes.set_committed_value(orm_obj, key, value)
+        _orm.make_transient_to_detached(orm_obj)
+        self.session.add(orm_obj)
+        return orm_obj
+
+    def _begin_cache(self, session, transaction, connection):
+        if self._read_at is None:
+            self._read_at = self.cache.generation
+
+    def _buffer_row(self, session, orm_obj):
+        # only rows fresh from the database, stored once they are committed
+        state = _sa.inspect(orm_obj)
+        if state.class_ not in self._cached_orm_classes:
+            return
+        keys = [prop.key for prop in state.mapper.column_attrs]
+        if all(key in state.dict for key in keys):
+            self._loaded_rows[state.class_, state.identity] = {
+                key: state.dict[key] for key in keys
+            }
+
+    def _collect_invalidations(self, session, flush_context):
+        for orm_obj in _itertools.chain(session.dirty, session.deleted):
+            state = _sa.inspect(orm_obj)
+            if state.class_ in self._cached_orm_classes and state.identity:
+                self._invalidations.add((state.class_, state.identity))
+
+    def _commit_cache(self, session):
+        for orm_cls, ident in self._invalidations:
+            self.cache.invalidate(self.get_domain_cls(orm_cls), ident)
+        for (orm_cls, ident), row in self._loaded_rows.items():
+            # a row read before the session changed it is outdated
+            if (orm_cls, ident) not in self._invalidations:
+                self.cache.set(
+                    self.get_domain_cls(orm_cls), ident, row, read_at=self._read_at
+                )
+        self._discard_cache(session)
+
+    def _rollback_cache(self, session):
+        # rows read since may show changes that are gone now, while the
+        # changes flushed before a rolled back savepoint still commit
+        self._loaded_rows.clear()
+        if not session.in_transaction():
+            self._discard_cache(session)
+
+    def _discard_cache(self, session):
+        self._invalidations.clear()
+        self._loaded_rows.clear()
+        self._read_at = None
+
+    def _load_relationship(self, orm_obj, key):
+        siblings = self._unloaded.get((orm_obj.__class__, key), {})
+        if self.batch_load and len(siblings) > 1:
+            self._batch_load(orm_obj.__class__, key, list(siblings))
+            siblings.clear()
+        siblings.pop(orm_obj, None)
+
+        # the cache is only asked here, not when converting; without implicit
+        # IO it is not asked at all, a remote cache would block
+        if self.cache is not None and self.implicit_io and key not in orm_obj.__dict__:
+            target = self._get_loaded_target(orm_obj, key, use_cache=True)
+            if target is not None:
+                return self.to_domain(target)
+
+        if not self.implicit_io and key in _sa.inspect(orm_obj).unloaded:
+            raise _sa.exc.InvalidRequestError(
+                f"{orm_obj.__class__.__name__}.{key} is not loaded, "
+                "load it explicitly (e.g. AsyncTwinMapper.load)"
+            )
+        value = getattr(orm_obj, key)
+        if _orm.class_mapper(orm_obj.__class__).relationships[key].uselist:
+            return list(map(self.to_domain, value))
+        return self.to_domain(value)
+
+    def _batch_load(self, orm_cls, key, orm_objs, chunk_size=500):
+        # selectinload fills the relationship of the parents already in the
+        # session and takes care of join conditions, order_by and secondary
+        mapper = _orm.class_mapper(orm_cls)
+        orm_objs = [orm_obj for orm_obj in orm_objs if key not in orm_obj.__dict__]
+        idents = [mapper.primary_key_from_instance(orm_obj) for orm_obj in orm_objs]
+        if len(mapper.primary_key) == 1:
+            pk = mapper.primary_key[0]
+            idents = [ident[0] for ident in idents]
+        else:
+            pk = _sa.tuple_(*mapper.primary_key)
+            idents = list(map(tuple, idents))
+
+        option = _orm.selectinload(getattr(orm_cls, key))
+        for start in range(0, len(idents), chunk_size):
+            self.session.query(orm_cls).filter(
+                pk.in_(idents[start : start + chunk_size])
+            ).options(option).all()
+
+    def _bulk_row(self, mapper, orm_obj):
+        state = orm_obj.__dict__
+        row = {
+            prop.key: state[prop.key]
+            for prop in mapper.column_attrs
+            if prop.key in state
+        }
+        for rel in mapper.relationships:
+            target = state.get(rel.key)
+            if rel.direction is not _orm.MANYTOONE or target is None:
+                continue
+            target_mapper = _orm.object_mapper(target)
+            for local, remote in rel.local_remote_pairs:
+                row[mapper.get_property_by_column(local).key] = getattr(
+                    target, target_mapper.get_property_by_column(remote).key
+                )
+        return row
+
+    def _update_orm(self, domain_obj, orm_obj):
+        self._get_converter(domain_obj.__class__)(self, domain_obj, orm_obj)
+
+    def _update_domain(self, orm_obj, domain_obj):
+        self._get_converter(orm_obj.__class__)(self, orm_obj, domain_obj)
+
+    @classmethod
+    def _get_converter(cls, src_cls):
+        try:
+            return cls._converters[src_cls]
+        except KeyError:
+            pass
+
+        name = f"map_{_inflection.underscore(src_cls.__name__)}"
+        converter = getattr(cls, name, None)
+        if converter is None:
+            converter = cls._compile_converter(name, src_cls)
+        cls._converters[src_cls] = converter
+        return converter
+
+    @classmethod
+    def _field_spec(cls, domain_cls):
+        """
+        Domain attribute names mapped to ORM attribute names
+        """
+        orm_mapper = _orm.class_mapper(dict(cls.mapping)[domain_cls])
+        fields = {}
+        if _dc.is_dataclass(domain_cls):
+            fields.update(
+                (field.name, field.name)
+                for field in _dc.fields(domain_cls)
+                if field.name in orm_mapper.attrs
+            )
+        for domain_attr, orm_attr in cls.fields.get(domain_cls, {}).items():
+            if orm_attr not in orm_mapper.attrs:
+                raise ValueError(
+                    f"{domain_cls.__name__}.{domain_attr} is mapped to "
+                    f"{orm_attr!r}, which {orm_mapper.class_.__name__} does not have"
+                )
+            fields[domain_attr] = orm_attr
+        return fields
+
+    @classmethod
+    def _compile_converter(cls, name, src_cls):
+        domain_to_orm = dict(cls.mapping)
+        if src_cls in domain_to_orm:
+            domain_cls, orm_cls = src_cls, domain_to_orm[src_cls]
+        else:
+            domain_cls, orm_cls = dict(map(reversed, cls.mapping))[src_cls], src_cls
+
+        orm_mapper = _orm.class_mapper(orm_cls)
+        fields = cls._field_spec(domain_cls)
+        if not fields and not _dc.is_dataclass(domain_cls):
+            raise ValueError(
+                f"No {name} method and no fields for {domain_cls.__name__}"
+            )
+
+        lines = [f"def {name}(mapper, src, dst):"]
+        for domain_attr, orm_attr in fields.items():
+            if not (domain_attr.isidentifier() and orm_attr.isidentifier()):
+                raise ValueError(f"Invalid field mapping {domain_attr!r}: {orm_attr!r}")
+            if src_cls is domain_cls:
+                src_attr, dst_attr = domain_attr, orm_attr
+            else:
+                src_attr, dst_attr = orm_attr, domain_attr
+
+            rel = orm_mapper.relationships.get(orm_attr)
+            if rel is None:
+                value = f"src.{src_attr}"
+            elif src_cls is domain_cls and rel.uselist:
+                value = f"list(map(mapper.to_orm, src.{src_attr}))"
+            elif src_cls is domain_cls:
+                value = f"mapper.to_orm(src.{src_attr})"
+            else:
+                value = (
+                    f"mapper._lazy(src, {orm_attr!r}, {rel.uselist}, dst, "
+                    f"{domain_attr!r})"
+                )
+                if rel.direction is _orm.MANYTOONE:
+                    # a missing foreign key needs neither proxy nor query
+                    fk_is_null = " or ".join(
+                        f"src.{orm_mapper.get_property_by_column(local).key} is None"
+                        for local, _ in rel.local_remote_pairs
+                    )
+                    value = f"None if {fk_is_null} else {value}"
+            lines.append(f"    dst.{dst_attr} = {value}")
+        if len(lines) == 1:
+            lines.append("    pass")
+
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace[name]
+
+
+@delegate_to("session")
+class AsyncTwinMapper:
+    """
+    `twin_mapper` on top of an `AsyncSession`.
+
+    Twins and conversions are handled by a `twin_mapper` over the sync session
+    behind the `AsyncSession`; all IO goes through `query`, `stream`, `get`,
+    `add_all` and `load`. Lazy relationships never load implicitly, they have
+    to be fetched with `load` first. Expired twins would refresh implicitly,
+    so the session has to use `expire_on_commit=False`.
+    """
+
+    twin_mapper: Type[TwinMapper]
+
+    def __init__(self, session):
+        if session.sync_session.expire_on_commit:
+            raise _sa.exc.InvalidRequestError(
+                "AsyncTwinMapper needs a session with expire_on_commit=False"
+            )
+        self.session = session
+        self.twins = self.twin_mapper(session.sync_session, implicit_io=False)
+
+    def add(self, domain_obj):
+        self.twins.add(domain_obj)
+
+    async def add_all(self, domain_objs, batch_size=1000):
+        await self.session.run_sync(
+            lambda _: self.twins.add_all(domain_objs, batch_size=batch_size)
+        )
+
+    async def get(self, domain_cls, ident):
+        return await self.session.run_sync(lambda _: self.twins.get(domain_cls, ident))
+
+    def select(self, domain_cls):
+        return _sa.select(self.twins.get_orm_cls(domain_cls))
+
+    async def query(self, statement):
+        if isinstance(statement, type):
+            statement = self.select(statement)
+        result = await self.session.execute(statement)
+        return list(map(self.twins.to_domain, result.scalars()))
+
+    async def stream(self, statement):
+        if isinstance(statement, type):
+            statement = self.select(statement)
+        result = await self.session.stream(statement)
+        async for orm_obj in result.scalars():
+            yield self.twins.to_domain(orm_obj)
+
+    async def load(self, domain_objs, attr):
+        """
+        Loads the lazy relationship `attr` of all `domain_objs` in one query
+        """
+        lazies = [
+            value
+            for value in (getattr(domain_obj, attr) for domain_obj in domain_objs)
+            if isinstance(value, (LazyList, LazyProxy))
+        ]
+        groups = {}
+        for lazy in lazies:
+            groups.setdefault((lazy._orm_obj.__class__, lazy._key), []).append(
+                lazy._orm_obj
+            )
+
+        def _load(sync_session):
+            for (orm_cls, key), orm_objs in groups.items():
+                self.twins._batch_load(orm_cls, key, orm_objs)
+
+        await self.session.run_sync(_load)
+        for lazy in lazies:
+            lazy._resolve()
+
+    def to_domain(self, orm_obj):
+        return self.twins.to_domain(orm_obj)
+
+    def to_orm(self, domain_obj):
+        return self.twins.to_orm(domain_obj)
@@ -0,0 +1,95 @@
+"""
+Custom pydantic types validated from a dict of annotated components,
+explored in tests/test_pydantic.py
+"""
+
+from typing import ClassVar, Dict, Mapping, get_type_hints
+
+import pydantic as _pydantic
+import pydantic.error_wrappers as _error_wrappers
+import pydantic.fields as _fields
+
+
+class ValueType:
+    """
+    Base for custom types validated from a dict of annotated components.
+
+    The component validators are built once per class, `validate_many`
+    validates a list of payloads in one go. Components with a class level
+    default are optional.
+    """
+
+    __config__: ClassVar = _pydantic.BaseConfig
+    __value_fields__: ClassVar[Dict[str, _fields.ModelField]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.__value_fields__ = {
+            name: _fields.ModelField.infer(
+                name=name,
+                value=getattr(cls, name, _fields.Required),
+                annotation=annotation,
+                class_validators=None,
+                config=cls.__config__,
+            )
+            for name, annotation in get_type_hints(cls).items()
+            if not name.startswith("__")
+            and getattr(annotation, "__origin__", None) is not ClassVar
+        }
+
+    def __init__(self, **values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, values):
+        obj, errors = cls._validate(values)
+        if errors:
+            raise _pydantic.ValidationError(errors, cls)
+        return obj
+
+    @classmethod
+    def validate_many(cls, payloads):
+        objs, errors = [], []
+        for index, values in enumerate(payloads):
+            obj, obj_errors = cls._validate(values)
+            objs.append(obj)
+            if obj_errors:
+                errors.append(
+                    _error_wrappers.ErrorWrapper(
+                        _pydantic.ValidationError(obj_errors, cls), index
+                    )
+                )
+        if errors:
+            raise _pydantic.ValidationError(errors, cls)
+        return objs
+
+    @classmethod
+    def _validate(cls, values):
+        if isinstance(values, cls):
+            return values, []
+        # the dict check first, isinstance on the typing ABC is comparatively slow
+        if not isinstance(values, dict) and not isinstance(values, Mapping):
+            return None, [_error_wrappers.ErrorWrapper(_pydantic.DictError(), ())]
+
+        kwargs, errors = {}, []
+        for name, field in cls.__value_fields__.items():
+            if name not in values:
+                if field.required:
+                    errors.append(
+                        _error_wrappers.ErrorWrapper(_pydantic.MissingError(), name)
+                    )
+                else:
+                    kwargs[name] = field.get_default()
+                continue
+            # a single ErrorWrapper or, for composite types, a list of them
+            kwargs[name], error = field.validate(values[name], {}, loc=name)
+            if error is not None:
+                errors.append(error)
+        if errors:
+            return None, errors
+        return cls(**kwargs), []